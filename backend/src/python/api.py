@@ -1,11 +1,23 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
+import asyncio
+import io
+import logging
+import multiprocessing
 import os
+import queue
+import re
+import sys
+import traceback
 import uuid
 from datetime import datetime, timedelta
-from pathlib import Path
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Import your existing functions
 from test import (
@@ -15,22 +27,39 @@ from test import (
     compute_contributions,
     export_pdf,
     export_excel,
-    REGISTRY
+    read_csv,
+    read_excel,
+    get_explainer,
+    PandasJSONResponse,
+    REGISTRY,
+    SHAP_AVAILABLE
 )
 from interpretation_rules import (
     generate_summary,
     generate_clinical_recommendations,
     generate_medication_recommendations,
     generate_related_disease_predictions,
-    interpret_feature
+    interpret_feature,
+    interpret_features
 )
 
 app = FastAPI(
     title="Readmission Risk Analysis API",
     description="Comprehensive hospital readmission risk prediction with clinical insights",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=PandasJSONResponse
 )
 
+logger = logging.getLogger("api")
+logger.setLevel(logging.INFO)
+
+# Writes straight to stderr until startup, so the import-time model-load
+# messages are shown; start_logging then moves it behind a queue listener
+LOG_HANDLER = logging.StreamHandler()
+LOG_HANDLER.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+logger.addHandler(LOG_HANDLER)
+logger.propagate = False
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -40,8 +69,197 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Temporary storage for generated files
-TEMP_FILES = {}
+# Strips markup from interpretation text for the JSON payload
+HTML_TAG_RE = re.compile(r"<[^<]+?>")
+
+# Candidate patient-name columns (lowercase), in priority order
+NAME_COLUMNS = ('patient_name', 'name', 'full_name', 'patientname')
+
+# Session limits for generated reports
+MAX_SESSIONS = 500
+SESSION_TTL = timedelta(hours=1)
+CLEANUP_INTERVAL_SECONDS = 15 * 60
+
+class SessionCache:
+    """
+    Bounded LRU store of report sessions.
+    Sessions over capacity or idle past the TTL are evicted with their in-memory reports.
+    """
+
+    def __init__(self, max_sessions, ttl):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._last_used = {}
+
+    def __contains__(self, session_id):
+        return session_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, session_id):
+        file_info = self._entries[session_id]
+        self._touch(session_id)
+        return file_info
+
+    def __setitem__(self, session_id, file_info):
+        self._entries[session_id] = file_info
+        self._touch(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._evict(next(iter(self._entries)))
+
+    def expire(self):
+        """Drop sessions idle past the TTL; entries are kept in last-used order."""
+        cutoff = datetime.now() - self.ttl
+        while self._entries:
+            oldest = next(iter(self._entries))
+            if self._last_used[oldest] >= cutoff:
+                break
+            self._evict(oldest)
+
+    def _touch(self, session_id):
+        self._entries.move_to_end(session_id)
+        self._last_used[session_id] = datetime.now()
+
+    def _evict(self, session_id):
+        del self._entries[session_id]
+        del self._last_used[session_id]
+
+# contrib_df columns exposed per feature in the /analyze payload
+TOP_FEATURE_COLUMNS = ["Feature", "Value", "Contribution"]
+
+# Report sessions awaiting download
+TEMP_FILES = SessionCache(MAX_SESSIONS, SESSION_TTL)
+
+# Loaded (model, train_cols, cat_levels) per disease, shared across requests.
+# Filled at import; forked analysis workers inherit it, spawned ones re-import.
+MODEL_CACHE = {}
+
+for disease in REGISTRY:
+    try:
+        MODEL_CACHE[disease] = load_model_and_metadata(disease)
+        logger.info("Loaded %s model", disease)
+    except Exception as e:
+        logger.error("Failed to load %s model: %s", disease, e)
+        continue
+    
+    # Built at import so forked workers inherit the explainer too
+    if SHAP_AVAILABLE:
+        try:
+            get_explainer(MODEL_CACHE[disease][0])
+        except Exception as e:
+            logger.warning("SHAP explainer unavailable for %s: %s", disease, e)
+
+def get_model(disease):
+    """Return cached model artifacts for a disease, loading them on first use."""
+    if disease not in MODEL_CACHE:
+        MODEL_CACHE[disease] = load_model_and_metadata(disease)
+    return MODEL_CACHE[disease]
+
+# Worker processes for CPU-bound scoring, so concurrent analyses are not
+# serialized by the GIL. Until startup runs, the default thread pool is used.
+ANALYSIS_POOL = None
+
+# fork shares MODEL_CACHE and the explainers copy-on-write. It is pinned rather
+# than left to the platform default (spawn on macOS, forkserver from Python 3.14),
+# and skipped on macOS where forking a threaded process is unsafe.
+FORK_AVAILABLE = "fork" in multiprocessing.get_all_start_methods() and sys.platform != "darwin"
+
+def create_analysis_pool(start_method):
+    pool = ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context(start_method)
+    )
+    # Under fork the first submit launches every worker at once, so this forks
+    # them now rather than lazily from a request
+    pool.submit(os.getpid).result()
+    return pool
+
+# Registered before the log listener's startup hook so workers fork while the
+# process is still single-threaded
+@app.on_event("startup")
+async def start_analysis_pool():
+    global ANALYSIS_POOL
+    ANALYSIS_POOL = create_analysis_pool("fork" if FORK_AVAILABLE else "spawn")
+
+@app.on_event("shutdown")
+async def stop_analysis_pool():
+    if ANALYSIS_POOL is not None:
+        ANALYSIS_POOL.shutdown(cancel_futures=True)
+
+async def run_in_pool(fn, *args):
+    """Run fn in ANALYSIS_POOL, replacing the pool if a worker process died."""
+    global ANALYSIS_POOL
+    pool = ANALYSIS_POOL
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        if ANALYSIS_POOL is pool:
+            logger.error("Analysis worker died; restarting the pool")
+            pool.shutdown(wait=False, cancel_futures=True)
+            # Requests fall back to threads while the replacement starts. Other
+            # threads are running by now, so the replacement never forks.
+            ANALYSIS_POOL = None
+            ANALYSIS_POOL = await run_in_threadpool(create_analysis_pool, "spawn")
+        raise
+
+# Log records are handed to a background listener so requests never block on stderr
+LOG_LISTENER = None
+LOG_QUEUE_HANDLER = None
+
+@app.on_event("startup")
+async def start_logging():
+    global LOG_LISTENER, LOG_QUEUE_HANDLER
+    log_queue = queue.SimpleQueue()
+    LOG_LISTENER = QueueListener(log_queue, LOG_HANDLER)
+    LOG_LISTENER.start()
+    LOG_QUEUE_HANDLER = QueueHandler(log_queue)
+    logger.removeHandler(LOG_HANDLER)
+    logger.addHandler(LOG_QUEUE_HANDLER)
+
+@app.on_event("shutdown")
+async def stop_logging():
+    if LOG_LISTENER is not None:
+        logger.removeHandler(LOG_QUEUE_HANDLER)
+        logger.addHandler(LOG_HANDLER)
+        LOG_LISTENER.stop()
+
+def analyze_patient(disease, df):
+    """Score the patient and explain the prediction. Runs in a worker process."""
+    model, train_cols, cat_levels = get_model(disease)
+    threshold = REGISTRY[disease]["threshold"]
+    
+    X = prepare_X(df, train_cols, cat_levels)
+    proba, decision = predict(model, X, threshold)
+    contrib_df = compute_contributions(model, X, train_cols)
+    return proba, decision, contrib_df
+
+async def periodic_cleanup():
+    """Expire idle report sessions in the background."""
+    while True:
+        TEMP_FILES.expire()
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+
+CLEANUP_TASK = None
+
+@app.on_event("startup")
+async def start_cleanup():
+    global CLEANUP_TASK
+    # Keep a reference so the task is not garbage-collected mid-sleep
+    CLEANUP_TASK = asyncio.create_task(periodic_cleanup())
+
+def parse_upload(source, filename):
+    """Parse an uploaded CSV/Excel file; None if the extension is unsupported."""
+    if filename.endswith(".csv"):
+        return read_csv(source)
+    if filename.endswith((".xls", ".xlsx")):
+        return read_excel(source)
+    return None
+
+async def read_upload(file: UploadFile):
+    """Parse an uploaded CSV/Excel file off the event loop; None if unsupported."""
+    return await run_in_threadpool(parse_upload, file.file, file.filename)
 
 # -----------------------------
 # Root Endpoint
@@ -90,103 +308,88 @@ async def analyze_file(
     - Download links for PDF/Excel reports
     """
     try:
-        print(f"\n{'='*60}")
-        print("ANALYZE REQUEST RECEIVED")
-        print(f"{'='*60}")
-        print(f"Disease requested: {disease}")
-        print(f"File: {file.filename}")
-        print(f"Available diseases: {list(REGISTRY.keys())}")
+        logger.debug("Analyze request: disease=%s file=%s", disease, file.filename)
         
         # Validate disease
         if disease not in REGISTRY:
             available_diseases = list(REGISTRY.keys())
-            print(f"Invalid disease: {disease}")
-            print(f"Available: {available_diseases}")
-            return JSONResponse(
+            logger.info("Invalid disease requested: %s", disease)
+            return PandasJSONResponse(
                 {"error": f"Disease must be one of: {available_diseases}"},
                 status_code=400
             )
         
-        print(f"Disease validated: {disease}")
-        
         # Read uploaded file into DataFrame
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(file.file)
-        elif file.filename.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file.file)
-        else:
-            return JSONResponse(
+        df = await read_upload(file)
+        if df is None:
+            return PandasJSONResponse(
                 {"error": "Only CSV or Excel files are supported."},
                 status_code=400
             )
         
-        print(f"File read successfully: {len(df)} rows, {len(df.columns)} columns")
+        logger.debug("File read: shape=%s", df.shape)
         
         if df.shape[0] == 0:
-            return JSONResponse(
+            return PandasJSONResponse(
                 {"error": "No data found in the file."},
                 status_code=400
             )
         
-        # Load model and predict
-        model, train_cols, cat_levels = load_model_and_metadata(disease)
+        # Predict and compute feature contributions in a worker process. Only the
+        # first patient is scored; the full frame still goes to the raw-data sheet.
         threshold = REGISTRY[disease]["threshold"]
+        proba, decision, contrib_df = await run_in_pool(analyze_patient, disease, df.iloc[:1])
         
-        X = prepare_X(df, train_cols, cat_levels)
-        proba, decision = predict(model, X, threshold)
-        
-        print(f"Prediction: probability={proba:.3f}, decision={decision}, threshold={threshold}")
-        
-        # Compute feature contributions
-        contrib_df = compute_contributions(model, X, train_cols)
+        logger.debug("Prediction: probability=%.3f decision=%s threshold=%s", proba, decision, threshold)
         
         # Generate unique patient ID and session ID
         patient_id = f"{datetime.now().strftime('%Y%m%d')}-{disease.replace(' ', '')[:3]}-{uuid.uuid4().hex[:6]}"
         session_id = uuid.uuid4().hex
         
-        print(f"Generated patient_id: {patient_id}")
-        print(f"Generated session_id: {session_id}")
+        logger.debug("Generated patient_id=%s session_id=%s", patient_id, session_id)
         
         # Extract patient name from DataFrame
         patient_name = "Unknown"
-        name_columns = ['patient_name', 'name', 'full_name', 'patientname', 'Patient_Name']
-        for col in name_columns:
-            if col in df.columns or col.lower() in [c.lower() for c in df.columns]:
-                matching_col = next((c for c in df.columns if c.lower() == col.lower()), None)
-                if matching_col and not pd.isna(df[matching_col].iloc[0]):
-                    patient_name = str(df[matching_col].iloc[0])
-                    print(f"Patient name found: {patient_name}")
-                    break
-        
-        # Generate PDF and Excel reports
-        pdf_path = export_pdf(patient_id, disease, df, proba, decision, threshold, contrib_df)
-        excel_path = export_excel(patient_id, disease, df, proba, decision, threshold, contrib_df)
-        
-        print(f"PDF generated: {pdf_path}")
-        print(f"Excel generated: {excel_path}")
+        # Lowercased name -> first column with that name
+        lower_to_col = {c.lower(): c for c in reversed(df.columns)}
+        for col in NAME_COLUMNS:
+            matching_col = lower_to_col.get(col)
+            if matching_col is not None and not pd.isna(df[matching_col].iat[0]):
+                patient_name = str(df[matching_col].iat[0])
+                break
         
-        # Store file paths with session ID
+        # Keep report inputs with session ID; PDF/Excel bytes are built on first download
         TEMP_FILES[session_id] = {
-            "pdf": pdf_path,
-            "excel": excel_path,
+            "pdf": None,
+            "excel": None,
             "timestamp": datetime.now(),
-            "patient_id": patient_id
+            "patient_id": patient_id,
+            "report_args": (patient_id, disease, df, proba, decision, threshold, contrib_df)
         }
         
         # Generate textual summaries
-        feature_values = contrib_df.set_index("Feature")["Value"].to_dict()
+        feature_values = dict(zip(contrib_df["Feature"].to_numpy(), contrib_df["Value"].to_numpy()))
         summary_text = generate_summary(contrib_df, disease, proba, decision)
         clinical_text = generate_clinical_recommendations(contrib_df, disease, feature_values)
         medication_text = generate_medication_recommendations(disease, contrib_df, feature_values)
         related_diseases_text = generate_related_disease_predictions(disease, contrib_df, feature_values)
         
         # Prepare top features with interpretations
-        top_features = contrib_df.head(10).copy()
-        top_features["Interpretation"] = top_features.apply(
-            lambda row: interpret_feature(disease, row["Feature"], row["Contribution"], row["Value"]),
-            axis=1
+        top_features = contrib_df.head(10)[TOP_FEATURE_COLUMNS]
+        interpretations = interpret_features(
+            disease,
+            top_features["Feature"].to_numpy(),
+            top_features["Contribution"].to_numpy(),
+            top_features["Value"].to_numpy()
         )
         
+        # Interpretation is attached per record, so the slice is never copied or mutated
+        top_feature_cols = top_features.columns.tolist() + ["Interpretation"]
+        top_feature_records = [
+            dict(zip(top_feature_cols, (*row, interpretation)))
+            for row, interpretation in zip(top_features.itertuples(index=False, name=None), interpretations)
+        ]
+        
         # Generate comprehensive interpretation for display
         top_factor = contrib_df.iloc[0]
         main_interpretation = interpret_feature(
@@ -197,8 +400,7 @@ async def analyze_file(
         )
         
         # Clean HTML tags from interpretation
-        import re
-        clean_interpretation = re.sub('<[^<]+?>', '', main_interpretation)
+        clean_interpretation = HTML_TAG_RE.sub("", main_interpretation)
         
         # Prepare JSON response
         result = {
@@ -214,7 +416,7 @@ async def analyze_file(
             "clinical_recommendations": clinical_text,
             "medication_recommendations": medication_text,
             "related_disease_predictions": related_diseases_text,
-            "top_features": top_features.to_dict(orient="records"),
+            "top_features": top_feature_records,
             "download_links": {
                 "pdf": f"/download/pdf/{session_id}",
                 "excel": f"/download/excel/{session_id}"
@@ -222,19 +424,11 @@ async def analyze_file(
             "timestamp": datetime.now().isoformat()
         }
         
-        print("\nSUCCESS - Returning response")
-        print(f"Disease in response: {result['disease']}")
-        print(f"{'='*60}\n")
-        
-        return JSONResponse(result)
+        return PandasJSONResponse(result)
     
     except Exception as e:
-        import traceback
-        print("\nERROR in /analyze endpoint")
-        print(f"Error: {str(e)}")
-        print(f"Traceback:\n{traceback.format_exc()}")
-        print(f"{'='*60}\n")
-        return JSONResponse(
+        logger.exception("/analyze failed")
+        return PandasJSONResponse(
             {
                 "error": f"Analysis failed: {str(e)}",
                 "details": traceback.format_exc()
@@ -245,6 +439,83 @@ async def analyze_file(
 # -----------------------------
 # Simplified Upload Endpoint (Backward Compatibility)
 # -----------------------------
+# Filename keywords per disease, checked after any REGISTRY aliases
+DISEASE_KEYWORDS = {
+    "Type 2 Diabetes": ["diabetes", "type2", "t2d"],
+    "Pneumonia": ["pneumonia", "respiratory"],
+    "Chronic Kidney Disease": ["kidney", "ckd", "renal"],
+    "COPD": ["copd", "obstructive"],
+    "Hypertension": ["hypertension", "blood_pressure", "bp"]
+}
+
+# Keyword -> disease; earlier entries win when a keyword is shared
+ALIAS_INDEX = {}
+for disease_name, config in REGISTRY.items():
+    for alias in config.get("aliases", []):
+        ALIAS_INDEX.setdefault(alias.lower(), disease_name)
+for disease_name, keywords in DISEASE_KEYWORDS.items():
+    for keyword in keywords:
+        ALIAS_INDEX.setdefault(keyword, disease_name)
+
+def detect_disease_from_filename(filename):
+    """Infer the disease from an upload's filename, or None if nothing matches."""
+    filename_lower = filename.lower().replace(" ", "_")
+    # Scanned in index order so the first disease in REGISTRY order wins when a
+    # filename names several ("hypertension_diabetes.csv" -> Type 2 Diabetes)
+    for keyword, disease_name in ALIAS_INDEX.items():
+        if keyword in filename_lower:
+            return disease_name
+    return None
+
+def _process_upload(source, filename, disease):
+    """Parse, score and render one /upload file; run via run_in_threadpool."""
+    df = parse_upload(source, filename)
+    if df is None:
+        return PandasJSONResponse(
+            {"error": "Only CSV or Excel files are supported."},
+            status_code=400
+        )
+    
+    if df.empty:
+        return PandasJSONResponse(
+            {"error": "The uploaded file is empty."},
+            status_code=400
+        )
+    
+    model, train_cols, cat_levels = get_model(disease)
+    threshold = REGISTRY[disease]["threshold"]
+    X = prepare_X(df, train_cols, cat_levels)
+    proba, decision = predict(model, X, threshold)
+    
+    def risk_band(p):
+        if p < 0.33:
+            return "Low"
+        elif p < 0.66:
+            return "Medium"
+        else:
+            return "High"
+    
+    df["Predicted_Prob"] = round(float(proba), 3)
+    df["Predicted_Class"] = int(decision)
+    df["Risk_Band"] = risk_band(proba)
+    
+    risk = df["Risk_Band"].iloc[0]
+    risk_counts = {
+        "high_risk_count": 1 if risk == "High" else 0,
+        "medium_risk_count": 1 if risk == "Medium" else 0,
+        "low_risk_count": 1 if risk == "Low" else 0
+    }
+    
+    # Returned directly so FastAPI skips jsonable_encoder's walk over every record
+    return PandasJSONResponse({
+        "disease": disease,
+        "records": df.to_dict(orient="records"),
+        "total_records": len(df),
+        **risk_counts,
+        "threshold": threshold,
+        "note": "Using simplified /upload endpoint. Use /analyze for comprehensive reports."
+    })
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """
@@ -255,32 +526,11 @@ async def upload_file(file: UploadFile = File(...)):
     """
     try:
         # Auto-detect disease from filename
-        disease = None
-        filename_lower = file.filename.lower().replace(" ", "_")
-        
-        for disease_name, config in REGISTRY.items():
-            aliases = config.get("aliases", [])
-            if any(alias in filename_lower for alias in aliases):
-                disease = disease_name
-                break
-        
-        if not disease:
-            disease_keywords = {
-                "Type 2 Diabetes": ["diabetes", "type2", "t2d"],
-                "Pneumonia": ["pneumonia", "respiratory"],
-                "Chronic Kidney Disease": ["kidney", "ckd", "renal"],
-                "COPD": ["copd", "obstructive"],
-                "Hypertension": ["hypertension", "blood_pressure", "bp"]
-            }
-            
-            for disease_name, keywords in disease_keywords.items():
-                if any(kw in filename_lower for kw in keywords):
-                    disease = disease_name
-                    break
+        disease = detect_disease_from_filename(file.filename)
         
         if not disease:
             available = ", ".join(REGISTRY.keys())
-            return JSONResponse(
+            return PandasJSONResponse(
                 {
                     "error": f"Could not detect disease type from filename '{file.filename}'. "
                              f"Please include disease name in filename or use /analyze endpoint. "
@@ -289,58 +539,12 @@ async def upload_file(file: UploadFile = File(...)):
                 status_code=400
             )
         
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(file.file)
-        elif file.filename.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file.file)
-        else:
-            return JSONResponse(
-                {"error": "Only CSV or Excel files are supported."},
-                status_code=400
-            )
-        
-        if df.empty:
-            return JSONResponse(
-                {"error": "The uploaded file is empty."},
-                status_code=400
-            )
-        
-        model, train_cols, cat_levels = load_model_and_metadata(disease)
-        threshold = REGISTRY[disease]["threshold"]
-        X = prepare_X(df, train_cols, cat_levels)
-        proba, decision = predict(model, X, threshold)
-        
-        def risk_band(p):
-            if p < 0.33:
-                return "Low"
-            elif p < 0.66:
-                return "Medium"
-            else:
-                return "High"
-        
-        df["Predicted_Prob"] = round(float(proba), 3)
-        df["Predicted_Class"] = int(decision)
-        df["Risk_Band"] = risk_band(proba)
-        
-        risk = df["Risk_Band"].iloc[0]
-        risk_counts = {
-            "high_risk_count": 1 if risk == "High" else 0,
-            "medium_risk_count": 1 if risk == "Medium" else 0,
-            "low_risk_count": 1 if risk == "Low" else 0
-        }
-        
-        return {
-            "disease": disease,
-            "records": df.to_dict(orient="records"),
-            "total_records": len(df),
-            **risk_counts,
-            "threshold": threshold,
-            "note": "Using simplified /upload endpoint. Use /analyze for comprehensive reports."
-        }
+        # Parsing, scoring and serialization all run in the threadpool
+        return await run_in_threadpool(_process_upload, file.file, file.filename, disease)
     
     except Exception as e:
-        import traceback
-        return JSONResponse(
+        logger.exception("/upload failed")
+        return PandasJSONResponse(
             {
                 "error": f"Upload failed: {str(e)}",
                 "details": traceback.format_exc()
@@ -351,40 +555,72 @@ async def upload_file(file: UploadFile = File(...)):
 # -----------------------------
 # Download Endpoints
 # -----------------------------
+def get_session(session_id):
+    """Look up a report session, or 404 if it never existed or has expired."""
+    if session_id not in TEMP_FILES:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return TEMP_FILES[session_id]
+
+async def get_report(session_id, file_info, kind, build):
+    """
+    Return a session's report bytes, building them in ANALYSIS_POOL on first request.
+    The slot holds the build's future, so concurrent downloads share one build.
+    file_info is held by the caller, so eviction mid-build cannot lose it.
+    """
+    if file_info[kind] is None:
+        file_info[kind] = asyncio.ensure_future(run_in_pool(build, *file_info["report_args"]))
+    future = file_info[kind]
+    try:
+        # Shielded so one client disconnecting does not cancel the shared build
+        report = await asyncio.shield(future)
+    except Exception:
+        if file_info[kind] is future:
+            file_info[kind] = None  # let the next request retry
+        raise
+    logger.debug("%s ready for session %s", kind.upper(), session_id)
+    return report
+
+def render_pdf(*report_args):
+    """Render the PDF report in memory and return its bytes."""
+    buf = io.BytesIO()
+    export_pdf(*report_args, fileobj=buf)
+    return buf.getvalue()
+
+def render_excel(*report_args):
+    """Render the Excel workbook in memory and return its bytes."""
+    buf = io.BytesIO()
+    export_excel(*report_args, fileobj=buf)
+    return buf.getvalue()
+
+def report_filename(file_info, suffix):
+    """Download filename for a session's report, e.g. <patient_id>_<Disease>_report.pdf."""
+    patient_id, disease = file_info["report_args"][:2]
+    return f"{patient_id}_{disease.replace(' ', '_')}{suffix}"
+
 @app.get("/download/pdf/{session_id}")
 async def download_pdf(session_id: str):
     """Download generated PDF report using session ID."""
-    if session_id not in TEMP_FILES:
-        raise HTTPException(status_code=404, detail="Session not found or expired")
+    file_info = get_session(session_id)
+    pdf_bytes = await get_report(session_id, file_info, "pdf", render_pdf)
+    filename = report_filename(file_info, "_report.pdf")
     
-    file_info = TEMP_FILES[session_id]
-    pdf_path = file_info["pdf"]
-    
-    if not os.path.exists(pdf_path):
-        raise HTTPException(status_code=404, detail="PDF file not found")
-    
-    return FileResponse(
-        pdf_path,
+    return Response(
+        pdf_bytes,
         media_type="application/pdf",
-        filename=os.path.basename(pdf_path)
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 @app.get("/download/excel/{session_id}")
 async def download_excel(session_id: str):
     """Download generated Excel report using session ID."""
-    if session_id not in TEMP_FILES:
-        raise HTTPException(status_code=404, detail="Session not found or expired")
-    
-    file_info = TEMP_FILES[session_id]
-    excel_path = file_info["excel"]
-    
-    if not os.path.exists(excel_path):
-        raise HTTPException(status_code=404, detail="Excel file not found")
+    file_info = get_session(session_id)
+    excel_bytes = await get_report(session_id, file_info, "excel", render_excel)
+    filename = report_filename(file_info, ".xlsx")
     
-    return FileResponse(
-        excel_path,
+    return Response(
+        excel_bytes,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=os.path.basename(excel_path)
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 # -----------------------------
@@ -431,4 +667,7 @@ async def get_diseases():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Single worker on purpose: report sessions live in this process's memory,
+    # and CPU-bound scoring already fans out over ANALYSIS_POOL. uvicorn's
+    # "auto" loop/http settings pick uvloop and httptools when installed.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto")
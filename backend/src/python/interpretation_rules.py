@@ -346,24 +346,49 @@ DISEASE_PROGRESSION_MAP = {
 # 7. Helper: interpret individual feature
 # ------------------------------
 def interpret_feature(disease, feature, shap_value, value=None):
-    feature_l = feature.lower()
-    base = INTERPRETATION_RULES.get(disease.lower(), {}).get(
-        feature_l, f"{feature} influences readmission risk."
+    return _interpret(INTERPRETATION_RULES.get(disease.lower(), {}), feature, shap_value, value)
+
+def interpret_features(disease, features, shap_values, values):
+    """Batched interpret_feature over parallel feature/SHAP/value sequences."""
+    rules = INTERPRETATION_RULES.get(disease.lower(), {})
+    return [
+        _interpret(rules, feature, shap_value, value)
+        for feature, shap_value, value in zip(features, shap_values, values)
+    ]
+
+# (low, high, unit, "ref low-high<unit>)") per feature; only the value varies per call
+REFERENCE_TEXT = {
+    feature: (ref["low"], ref["high"], ref["unit"], f"ref {ref['low']}-{ref['high']}{ref['unit']})")
+    for feature, ref in REFERENCE_RANGES.items()
+}
+
+# Medication advice plus "May be associated with:" text per feature, joined once
+FEATURE_NOTES = {
+    feature: MED_RECOMMENDATIONS.get(feature, "") + (
+        f" May be associated with: {', '.join(CORRELATED_CONDITIONS[feature])}."
+        if CORRELATED_CONDITIONS.get(feature) else ""
     )
+    for feature in MED_RECOMMENDATIONS.keys() | CORRELATED_CONDITIONS.keys()
+}
+
+def _interpret(rules, feature, shap_value, value):
+    feature_l = feature.lower()
+    base = rules.get(feature_l, f"{feature} influences readmission risk.")
 
     # Reference range & abnormality detection
-    ref = REFERENCE_RANGES.get(feature_l)
+    ref = REFERENCE_TEXT.get(feature_l)
     ref_txt = ""
     if value is not None and ref is not None:
         try:
             if isinstance(value, (int, float, str)):
                 val = float(value)
-                if val > ref["high"]:
-                    ref_txt = f" ({val:.2f}{ref['unit']} — above ref {ref['low']}-{ref['high']}{ref['unit']})"
-                elif val < ref["low"]:
-                    ref_txt = f" ({val:.2f}{ref['unit']} — below ref {ref['low']}-{ref['high']}{ref['unit']})"
+                low, high, unit, range_txt = ref
+                if val > high:
+                    ref_txt = f" ({val:.2f}{unit} — above {range_txt}"
+                elif val < low:
+                    ref_txt = f" ({val:.2f}{unit} — below {range_txt}"
                 else:
-                    ref_txt = f" ({val:.2f}{ref['unit']}; ref {ref['low']}-{ref['high']}{ref['unit']})"
+                    ref_txt = f" ({val:.2f}{unit}; {range_txt}"
             else:
                 ref_txt = f" ({str(value)})"
         except Exception:
@@ -376,18 +401,23 @@ def interpret_feature(disease, feature, shap_value, value=None):
     )
     direction = "increases" if shap_value > 0 else "reduces"
 
-    rec = MED_RECOMMENDATIONS.get(feature_l, "")
-    corr = CORRELATED_CONDITIONS.get(feature_l, [])
-    corr_txt = f" May be associated with: {', '.join(corr)}." if corr else ""
-
     return (
         f"{base}{ref_txt}. This feature has a {strength} effect and {direction} the readmission risk. "
-        f"{rec}{corr_txt}"
+        f"{FEATURE_NOTES.get(feature_l, '')}"
     )
 
 # ------------------------------
 # 8. Helper: generate summary paragraph
 # ------------------------------
+# Follow-up advice by disease keyword; first match wins
+SUMMARY_FOLLOWUPS = {
+    "pneumonia": "Recommend infection monitoring and follow-up chest imaging.",
+    "diabetes": "Review glycemic control and medication adherence.",
+    "copd": "Encourage respiratory therapy and inhaler adherence.",
+    "heart": "Suggest cardiac review and fluid management.",
+}
+DEFAULT_FOLLOWUP = "Recommend scheduled follow-up and monitoring."
+
 def generate_summary(contrib_df, disease, proba, decision):
     """Generate readable summary with risk level and key features."""
     risk_level = "high" if decision == 1 else "low"
@@ -401,33 +431,19 @@ def generate_summary(contrib_df, disease, proba, decision):
         f"Protective factors include <b>{', '.join(top_neg) if top_neg else 'none'}</b>. "
     )
 
-    if "pneumonia" in disease.lower():
-        follow = "Recommend infection monitoring and follow-up chest imaging."
-    elif "diabetes" in disease.lower():
-        follow = "Review glycemic control and medication adherence."
-    elif "copd" in disease.lower():
-        follow = "Encourage respiratory therapy and inhaler adherence."
-    elif "heart" in disease.lower():
-        follow = "Suggest cardiac review and fluid management."
-    else:
-        follow = "Recommend scheduled follow-up and monitoring."
+    disease_l = disease.lower()
+    follow = next(
+        (text for keyword, text in SUMMARY_FOLLOWUPS.items() if keyword in disease_l),
+        DEFAULT_FOLLOWUP
+    )
 
     return f"<b>Summary:</b> {base}{detail}{follow}"
 
 # ------------------------------
 # 9. NEW: Generate medication recommendations
 # ------------------------------
-def generate_medication_recommendations(disease, contrib_df, feature_values):
-    """
-    Generate specific medication recommendations based on disease and risk factors.
-    
-    Returns formatted HTML string with medication protocols.
-    """
-    protocols = MEDICATION_PROTOCOLS.get(disease, {})
-    
-    if not protocols:
-        return "<b>Medication Recommendations:</b><br/>Consult with attending physician for appropriate therapy."
-    
+def _render_medication_protocol(protocols):
+    """HTML for a disease's static medication protocol; built once per disease at import."""
     output = ["<b>Recommended Medication Protocol:</b><br/>"]
     
     # First-line therapy
@@ -458,20 +474,28 @@ def generate_medication_recommendations(disease, contrib_df, feature_values):
     
     return "".join(output)
 
-# ------------------------------
-# 10. NEW: Generate related disease predictions
-# ------------------------------
-def generate_related_disease_predictions(disease, contrib_df, feature_values):
+RENDERED_MEDICATION_PROTOCOLS = {
+    disease: _render_medication_protocol(protocols)
+    for disease, protocols in MEDICATION_PROTOCOLS.items()
+    if protocols
+}
+
+def generate_medication_recommendations(disease, contrib_df, feature_values):
     """
-    Predict potential future diseases based on current condition and risk factors.
+    Generate specific medication recommendations based on disease and risk factors.
     
-    Returns formatted HTML string with disease progression risks.
+    Returns formatted HTML string with medication protocols.
     """
-    progression = DISEASE_PROGRESSION_MAP.get(disease, {})
-    
-    if not progression:
-        return "<b>Related Disease Risk:</b><br/>No specific progression data available for this condition."
-    
+    return RENDERED_MEDICATION_PROTOCOLS.get(
+        disease,
+        "<b>Medication Recommendations:</b><br/>Consult with attending physician for appropriate therapy."
+    )
+
+# ------------------------------
+# 10. NEW: Generate related disease predictions
+# ------------------------------
+def _render_progression(progression):
+    """HTML for a disease's static progression risks; built once per disease at import."""
     output = ["<b>Potential Disease Progression & Related Conditions:</b><br/>"]
     
     # High-risk diseases
@@ -491,48 +515,53 @@ def generate_related_disease_predictions(disease, contrib_df, feature_values):
             output.append(f"   • <i>Risk Factors:</i> {', '.join(risk_disease['risk_factors'])}<br/>")
             output.append(f"   • <i>Prevention:</i> {risk_disease['prevention']}<br/>")
     
-    # Add personalized risk assessment based on feature values
     output.append("<br/><b>Personalized Risk Assessment:</b><br/>")
-    output.append(generate_personalized_risk_assessment(disease, feature_values))
-    
     return "".join(output)
 
-def generate_personalized_risk_assessment(disease, feature_values):
-    """Generate personalized risk factors based on actual patient values."""
-    risks = []
-    
-    # Check for elevated risk markers
-    if "creatinine" in feature_values:
-        try:
-            creat = float(feature_values["creatinine"])
-            if creat > 1.5:
-                risks.append("Elevated creatinine suggests increased kidney disease risk")
-        except:
-            pass
+RENDERED_PROGRESSION = {
+    disease: _render_progression(progression)
+    for disease, progression in DISEASE_PROGRESSION_MAP.items()
+    if progression
+}
+
+def generate_related_disease_predictions(disease, contrib_df, feature_values):
+    """
+    Predict potential future diseases based on current condition and risk factors.
     
-    if "hba1c" in feature_values:
-        try:
-            hba1c = float(feature_values["hba1c"])
-            if hba1c > 8.0:
-                risks.append("HbA1c >8% significantly increases microvascular complication risk")
-        except:
-            pass
+    Returns formatted HTML string with disease progression risks.
+    """
+    progression = RENDERED_PROGRESSION.get(disease)
     
-    if "systolic_bp" in feature_values:
-        try:
-            sbp = float(feature_values["systolic_bp"])
-            if sbp > 160:
-                risks.append("Systolic BP >160 increases stroke and heart failure risk")
-        except:
-            pass
+    if progression is None:
+        return "<b>Related Disease Risk:</b><br/>No specific progression data available for this condition."
     
-    if "oxygen_saturation" in feature_values:
-        try:
-            spo2 = float(feature_values["oxygen_saturation"])
-            if spo2 < 90:
-                risks.append("Chronic hypoxemia may lead to cor pulmonale and respiratory failure")
-        except:
-            pass
+    # Only the personalized assessment depends on the patient
+    return progression + generate_personalized_risk_assessment(disease, feature_values)
+
+# (feature, threshold, direction, message); direction 1 flags values above the
+# threshold, -1 values below it
+PERSONALIZED_RISK_MARKERS = [
+    ("creatinine", 1.5, 1, "Elevated creatinine suggests increased kidney disease risk"),
+    ("hba1c", 8.0, 1, "HbA1c >8% significantly increases microvascular complication risk"),
+    ("systolic_bp", 160, 1, "Systolic BP >160 increases stroke and heart failure risk"),
+    ("oxygen_saturation", 90, -1, "Chronic hypoxemia may lead to cor pulmonale and respiratory failure"),
+]
+RISK_MARKER_THRESHOLDS = np.array([m[1] for m in PERSONALIZED_RISK_MARKERS], dtype=float)
+RISK_MARKER_DIRECTIONS = np.array([m[2] for m in PERSONALIZED_RISK_MARKERS], dtype=float)
+
+def _marker_value(feature_values, feature):
+    """Patient value as a float, or NaN when absent or not numeric."""
+    try:
+        return float(feature_values[feature])
+    except Exception:
+        return np.nan
+
+def generate_personalized_risk_assessment(disease, feature_values):
+    """Generate personalized risk factors based on actual patient values."""
+    values = np.array([_marker_value(feature_values, m[0]) for m in PERSONALIZED_RISK_MARKERS])
+    # NaN compares False, so missing markers never flag
+    flagged = RISK_MARKER_DIRECTIONS * values > RISK_MARKER_DIRECTIONS * RISK_MARKER_THRESHOLDS
+    risks = [PERSONALIZED_RISK_MARKERS[i][3] for i in np.flatnonzero(flagged)]
     
     if risks:
         return "• " + "<br/>• ".join(risks) + "<br/>"
@@ -542,6 +571,20 @@ def generate_personalized_risk_assessment(disease, feature_values):
 # ------------------------------
 # 11. UPDATED: Clinical recommendations with medications & related diseases
 # ------------------------------
+# Sentences in an interpretation that carry an actionable recommendation
+RECOMMENDATION_RE = re.compile(
+    r"(?:Review|Ensure|Adjust|Monitor|Assess|Reinforce|Encourage|Consider)[^.;]+[.;]"
+)
+ASSOCIATION_RE = re.compile(r"May be associated with:(.+)")
+
+def _parse_explanation(explanation):
+    """Recommendation sentences and associated conditions found in an interpretation."""
+    rec_matches = tuple(RECOMMENDATION_RE.findall(explanation))
+    assoc_match = ASSOCIATION_RE.search(explanation)
+    if not assoc_match:
+        return rec_matches, ()
+    return rec_matches, tuple(c.strip().strip(".") for c in assoc_match.group(1).split(","))
+
 def generate_clinical_recommendations(contrib_df, disease, feature_values):
     """
     Enhanced function that generates:
@@ -555,27 +598,23 @@ def generate_clinical_recommendations(contrib_df, disease, feature_values):
     recommendations = []
     correlations = []
 
-    top_features = contrib_df.sort_values(by="Contribution", key=abs, ascending=False).head(6)
+    top_features = contrib_df.loc[contrib_df["Contribution"].abs().nlargest(6).index]
 
-    for _, row in top_features.iterrows():
-        feature = row["Feature"]
-        shap_val = row["Contribution"]
-        value = feature_values.get(feature, None)
+    features = top_features["Feature"].tolist()
+    explanations = interpret_features(
+        disease,
+        features,
+        top_features["Contribution"].tolist(),
+        [feature_values.get(feature, None) for feature in features]
+    )
 
-        explanation = interpret_feature(disease, feature, shap_val, value)
+    for explanation in explanations:
         if not explanation:
             continue
 
-        rec_matches = re.findall(
-            r"(?:Review|Ensure|Adjust|Monitor|Assess|Reinforce|Encourage|Consider)[^.;]+[.;]",
-            explanation
-        )
+        rec_matches, conditions = _parse_explanation(explanation)
         recommendations.extend(rec_matches)
-
-        assoc_match = re.search(r"May be associated with:(.+)", explanation)
-        if assoc_match:
-            conditions = [c.strip().strip(".") for c in assoc_match.group(1).split(",")]
-            correlations.extend(conditions)
+        correlations.extend(conditions)
 
     if not recommendations:
         recommendations = [
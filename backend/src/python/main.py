@@ -1,16 +1,44 @@
 from fastapi import FastAPI, UploadFile, File, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
+import numpy as np
 import joblib
-import io
-import matplotlib
 from pathlib import Path
+import logging
 import os
 import re
 
-matplotlib.use("Agg")
+# Shared CSV reader (PyArrow's parser, with pandas' dtypes and raw date text),
+# scorer and response class. Uploads are batches, so predict_proba keeps
+# LightGBM's threads.
+from test import PandasJSONResponse, predict_proba, read_csv
 
-app = FastAPI(title="Readmission Risk API")
+# Prefer the Rust-based calamine reader (pandas >= 2.2); openpyxl otherwise
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except Exception:
+    EXCEL_ENGINE = "openpyxl"
+
+# Optional pyarrow for parquet output
+try:
+    import pyarrow.parquet  # noqa: F401
+    PARQUET_AVAILABLE = True
+except Exception:
+    PARQUET_AVAILABLE = False
+
+app = FastAPI(title="Readmission Risk API", default_response_class=PandasJSONResponse)
+
+logger = logging.getLogger("main")
+logger.setLevel(logging.INFO)
+
+# Own stderr handler, so the model-load messages below show under any runner
+LOG_HANDLER = logging.StreamHandler()
+LOG_HANDLER.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+logger.addHandler(LOG_HANDLER)
+logger.propagate = False
 
 app.add_middleware(
     CORSMiddleware,
@@ -82,20 +110,20 @@ for disease, config in DISEASE_REGISTRY.items():
                 "cat_levels": cat_levels,
                 "threshold": config["threshold"]
             }
-            print(f"Loaded {disease} model")
+            logger.info("Loaded %s model", disease)
         except Exception as e:
-            print(f"Failed to load {disease} model: {e}")
+            logger.error("Failed to load %s model: %s", disease, e)
     else:
         missing = []
         if not model_path.exists(): missing.append("model")
         if not cols_path.exists(): missing.append("columns")
         if not categories_path.exists(): missing.append("categories")
-        print(f"{disease}: Missing {', '.join(missing)} file(s)")
+        logger.warning("%s: Missing %s file(s)", disease, ", ".join(missing))
 
 if not LOADED_MODELS:
     raise FileNotFoundError("No models loaded! Check models directory.")
 
-print(f"Successfully loaded {len(LOADED_MODELS)} models: {list(LOADED_MODELS.keys())}")
+logger.info("Successfully loaded %d models: %s", len(LOADED_MODELS), list(LOADED_MODELS))
 
 # Root endpoint for health checks
 @app.get("/")
@@ -133,62 +161,64 @@ def prepare_X(df: pd.DataFrame, train_cols: list, cat_levels: dict) -> pd.DataFr
     
     return X
 
+# Disease-specific column patterns
+DISEASE_INDICATORS = {
+    "Type 2 Diabetes": {
+        'required': frozenset({'age', 'cci', 'los'}),
+        'indicators': frozenset({'glucose', 'hba1c', 'insulin', 'diabetes', 'albumin', 'hematocrit'})
+    },
+    "Pneumonia": {
+        'required': frozenset({'age', 'los'}),
+        'indicators': frozenset({'pneumonia', 'oxygen', 'wbc', 'temperature', 'comorb', 'followup'})
+    },
+    "Chronic Kidney Disease": {
+        'required': frozenset({'age', 'creatinine'}),
+        'indicators': frozenset({'kidney', 'ckd', 'gfr', 'bun', 'albumin', 'dialysis'})
+    },
+    "COPD": {
+        'required': frozenset({'age'}),
+        'indicators': frozenset({'copd', 'fev', 'smoking', 'oxygen', 'respiratory', 'exacerbation'})
+    },
+    "Hypertension": {
+        'required': frozenset({'age'}),
+        'indicators': frozenset({'hypertension', 'systolic', 'diastolic', 'bp', 'blood_pressure'})
+    }
+}
+
+# Column-name substrings that mark a file as non-medical / as medical
+NON_MEDICAL_KEYWORDS = [
+    'product', 'price', 'quantity', 'sales', 'customer', 'order',
+    'invoice', 'item', 'category', 'sku', 'discount'
+]
+MEDICAL_KEYWORDS = [
+    'patient', 'age', 'admission', 'diagnosis', 'medical', 'hospital',
+    'los', 'length_of_stay', 'readmission', 'visit', 'discharge'
+]
+NON_MEDICAL_RE = re.compile("|".join(map(re.escape, NON_MEDICAL_KEYWORDS)))
+MEDICAL_RE = re.compile("|".join(map(re.escape, MEDICAL_KEYWORDS)))
+
 # Schema validation with disease detection
 def validate_schema(df: pd.DataFrame, filename: str = "") -> tuple[str, bool, str]:
     """
     Validate if the uploaded file contains hospital readmission data.
     Returns: (disease_type, is_valid, error_message)
     """
-    df_cols = set(c.lower().strip().replace(" ", "_") for c in df.columns)
+    df_cols = frozenset(
+        df.columns.astype(str).str.lower().str.strip().str.replace(" ", "_", regex=False)
+    )
     
-    # Disease-specific column patterns
-    disease_indicators = {
-        "Type 2 Diabetes": {
-            'required': {'age', 'cci', 'los'},
-            'indicators': {'glucose', 'hba1c', 'insulin', 'diabetes', 'albumin', 'hematocrit'}
-        },
-        "Pneumonia": {
-            'required': {'age', 'los'},
-            'indicators': {'pneumonia', 'oxygen', 'wbc', 'temperature', 'comorb', 'followup'}
-        },
-        "Chronic Kidney Disease": {
-            'required': {'age', 'creatinine'},
-            'indicators': {'kidney', 'ckd', 'gfr', 'bun', 'albumin', 'dialysis'}
-        },
-        "COPD": {
-            'required': {'age'},
-            'indicators': {'copd', 'fev', 'smoking', 'oxygen', 'respiratory', 'exacerbation'}
-        },
-        "Hypertension": {
-            'required': {'age'},
-            'indicators': {'hypertension', 'systolic', 'diastolic', 'bp', 'blood_pressure'}
-        }
-    }
+    # One regex pass over all column names; "\n" never occurs in a keyword,
+    # so a match is still a keyword inside a single column
+    cols_text = "\n".join(df_cols)
     
     # Check for non-medical data
-    non_medical_keywords = [
-        'product', 'price', 'quantity', 'sales', 'customer', 'order',
-        'invoice', 'item', 'category', 'sku', 'discount'
-    ]
-    
-    has_non_medical = any(
-        any(keyword in col for keyword in non_medical_keywords)
-        for col in df_cols
-    )
+    has_non_medical = NON_MEDICAL_RE.search(cols_text) is not None
     
     if has_non_medical:
         return "Unknown", False, "This file appears to contain non-medical data. Please upload hospital readmission patient data."
     
     # Check medical context
-    medical_keywords = [
-        'patient', 'age', 'admission', 'diagnosis', 'medical', 'hospital',
-        'los', 'length_of_stay', 'readmission', 'visit', 'discharge'
-    ]
-    
-    has_medical_context = any(
-        any(keyword in col for keyword in medical_keywords)
-        for col in df_cols
-    )
+    has_medical_context = MEDICAL_RE.search(cols_text) is not None
     
     if not has_medical_context and len(df_cols) > 5:
         return "Unknown", False, "This file does not appear to contain hospital readmission data."
@@ -199,14 +229,14 @@ def validate_schema(df: pd.DataFrame, filename: str = "") -> tuple[str, bool, st
         for alias in config["aliases"]:
             if alias in filename_lower:
                 if disease in LOADED_MODELS:
-                    print(f"Disease detected from filename: {disease}")
+                    logger.debug("Disease detected from filename: %s", disease)
                     return disease, True, ""
     
     # Score each disease based on column matches
     best_match = None
     best_score = 0
     
-    for disease, patterns in disease_indicators.items():
+    for disease, patterns in DISEASE_INDICATORS.items():
         if disease not in LOADED_MODELS:
             continue
         
@@ -220,98 +250,127 @@ def validate_schema(df: pd.DataFrame, filename: str = "") -> tuple[str, bool, st
             best_match = disease
     
     if best_match and best_score >= 0.4:
-        print(f"Disease detected from columns: {best_match} (score: {best_score:.2f})")
+        logger.debug("Disease detected from columns: %s (score: %.2f)", best_match, best_score)
         return best_match, True, ""
     
     available_diseases = ", ".join(LOADED_MODELS.keys())
     return "Unknown", False, f"Unable to determine disease type. Available models: {available_diseases}. Please ensure your file contains appropriate medical data columns."
 
-def risk_band(p: float) -> str:
-    """Categorize probability into risk bands"""
-    if p < 0.33: return "Low"
-    if p < 0.66: return "Medium"
-    return "High"
+# Risk bands: Low below 0.33, Medium below 0.66, High otherwise (pd.cut with right=False)
+RISK_BAND_BINS = [-np.inf, 0.33, 0.66, np.inf]
+RISK_BAND_LABELS = ["Low", "Medium", "High"]
+
+# Response layouts accepted by /upload's format parameter
+UPLOAD_FORMATS = {"json", "columns", "parquet"}
+
+def _process_upload(source, filename: str, format: str) -> Response:
+    """
+    Parse, validate, score and render one upload. Plain function so the whole
+    pipeline runs in the threadpool rather than on the event loop.
+    """
+    try:
+        if filename.endswith(".csv"):
+            df = read_csv(source)
+        else:
+            df = pd.read_excel(source, engine=EXCEL_ENGINE)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error reading file: {str(e)}. Please ensure the file is a valid CSV or Excel file."
+        )
+    
+    if df.empty or len(df) == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="The uploaded file is empty. Please upload a file with patient data."
+        )
+    
+    disease, is_valid, error_message = validate_schema(df, filename)
+    
+    if not is_valid:
+        raise HTTPException(
+            status_code=400,
+            detail=error_message
+        )
+    
+    if disease not in LOADED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model for {disease} is not loaded. Available models: {', '.join(LOADED_MODELS.keys())}"
+        )
+    
+    model_config = LOADED_MODELS[disease]
+    model = model_config["model"]
+    train_cols = model_config["train_cols"]
+    cat_levels = model_config["cat_levels"]
+    threshold = model_config["threshold"]
+    
+    try:
+        X = prepare_X(df, train_cols, cat_levels)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error preparing data for {disease} model: {str(e)}"
+        )
+    
+    try:
+        probs = predict_proba(model, X)
+        preds = (probs >= threshold).astype(int)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error generating predictions for {disease}: {str(e)}"
+        )
+    
+    df["Predicted_Prob"] = probs.round(3)
+    df["Predicted_Class"] = preds
+    df["Risk_Band"] = pd.cut(probs, bins=RISK_BAND_BINS, labels=RISK_BAND_LABELS, right=False)
+    band_counts = df["Risk_Band"].value_counts()
+    
+    if format == "parquet":
+        return Response(
+            df.to_parquet(index=False),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="predictions.parquet"'}
+        )
+    
+    if format == "columns":
+        # One list per column instead of one dict per row
+        records = {
+            "columns": df.columns.tolist(),
+            "data": {c: df[c].tolist() for c in df.columns}
+        }
+    else:
+        records = df.to_dict(orient="records")
+    
+    # The response renders its body on construction, so serialization happens
+    # here too, and FastAPI skips jsonable_encoder's walk over every record
+    return PandasJSONResponse({
+        "disease": disease,
+        "records": records,
+        "total_records": len(df),
+        "high_risk_count": int(band_counts["High"]),
+        "medium_risk_count": int(band_counts["Medium"]),
+        "low_risk_count": int(band_counts["Low"]),
+        "threshold": threshold
+    })
 
 # Upload endpoint with validation
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...), format: str = Query("json")):
     try:
-        contents = await file.read()
-        
-        try:
-            if file.filename.endswith(".csv"):
-                df = pd.read_csv(io.BytesIO(contents))
-            else:
-                df = pd.read_excel(io.BytesIO(contents), engine='openpyxl')
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error reading file: {str(e)}. Please ensure the file is a valid CSV or Excel file."
-            )
-        
-        if df.empty or len(df) == 0:
+        if format not in UPLOAD_FORMATS:
             raise HTTPException(
                 status_code=400,
-                detail="The uploaded file is empty. Please upload a file with patient data."
+                detail=f"Unsupported format '{format}'. Choose one of: {', '.join(sorted(UPLOAD_FORMATS))}"
             )
+        if format == "parquet" and not PARQUET_AVAILABLE:
+            raise HTTPException(status_code=400, detail="Parquet output requires pyarrow on the server.")
         
-        disease, is_valid, error_message = validate_schema(df, file.filename)
-        
-        if not is_valid:
-            raise HTTPException(
-                status_code=400,
-                detail=error_message
-            )
-        
-        if disease not in LOADED_MODELS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Model for {disease} is not loaded. Available models: {', '.join(LOADED_MODELS.keys())}"
-            )
-        
-        model_config = LOADED_MODELS[disease]
-        model = model_config["model"]
-        train_cols = model_config["train_cols"]
-        cat_levels = model_config["cat_levels"]
-        threshold = model_config["threshold"]
-        
-        try:
-            X = prepare_X(df, train_cols, cat_levels)
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error preparing data for {disease} model: {str(e)}"
-            )
-        
-        try:
-            if hasattr(model, 'predict_proba'):
-                probs = model.predict_proba(X)[:, 1]
-            else:
-                import numpy as np
-                predictions = model.predict(X)
-                probs = 1 / (1 + np.exp(-predictions.ravel()))
-            
-            preds = (probs >= threshold).astype(int)
-            
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error generating predictions for {disease}: {str(e)}"
-            )
-        
-        df["Predicted_Prob"] = probs.round(3)
-        df["Predicted_Class"] = preds
-        df["Risk_Band"] = [risk_band(p) for p in probs]
-        
-        return {
-            "disease": disease,
-            "records": df.to_dict(orient="records"),
-            "total_records": len(df),
-            "high_risk_count": len([r for r in df["Risk_Band"] if r == "High"]),
-            "medium_risk_count": len([r for r in df["Risk_Band"] if r == "Medium"]),
-            "low_risk_count": len([r for r in df["Risk_Band"] if r == "Low"]),
-            "threshold": threshold
-        }
+        # Parse straight from Starlette's spooled temp file (rolled to disk past 1 MB)
+        # rather than reading the whole upload into a bytes buffer first
+        return await run_in_threadpool(_process_upload, file.file, file.filename, format)
     
     except HTTPException:
         raise
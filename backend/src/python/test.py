@@ -1,12 +1,25 @@
 # report_generator.py
+import logging
 import os
 import joblib
 import numpy as np
+import orjson
 import pandas as pd
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 
-from interpretation_rules import interpret_feature, generate_summary, generate_clinical_recommendations
+from interpretation_rules import (
+    interpret_feature,
+    generate_summary,
+    generate_medication_recommendations,
+    generate_related_disease_predictions,
+    REFERENCE_RANGES,
+    MEDICATION_PROTOCOLS,
+    DISEASE_PROGRESSION_MAP
+)
+
+logger = logging.getLogger("report_generator")
 
 
 # Optional SHAP for feature contributions
@@ -16,12 +29,37 @@ try:
 except Exception:
     SHAP_AVAILABLE = False
 
+# Optional LightGBM, for the booster fast path in predict_proba
+try:
+    import lightgbm as lgb
+    LIGHTGBM_AVAILABLE = True
+except Exception:
+    LIGHTGBM_AVAILABLE = False
+
+# Optional PyArrow for multithreaded CSV parsing
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
+
+# Optional Rust-based Excel reader (pandas >= 2.2); openpyxl otherwise
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except Exception:
+    EXCEL_ENGINE = "openpyxl"
+
+from fastapi.responses import ORJSONResponse
+
 # PDF + Excel
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, LongTable
+from reportlab.lib.units import inch
+from reportlab.lib.enums import TA_LEFT
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-import xlsxwriter
 
 # -----------------------------------------------------
 # Configuration
@@ -39,6 +77,82 @@ REGISTRY = {
 }
 
 
+# -----------------------------------------------------
+# File ingest
+# -----------------------------------------------------
+# pandas' default NA strings and bool spellings, so PyArrow's parser yields
+# the same dtypes and missing values as pd.read_csv
+CSV_NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
+CSV_TRUE_VALUES = ["True", "TRUE", "true"]
+CSV_FALSE_VALUES = ["False", "FALSE", "false"]
+
+
+def read_csv(source):
+    """Read a CSV path or file object, using PyArrow's parallel parser when installed."""
+    if not PYARROW_AVAILABLE:
+        return pd.read_csv(source)
+    start = None if isinstance(source, (str, os.PathLike)) else source.tell()
+
+    def parse(column_types=None):
+        if start is not None:
+            source.seek(start)
+        return pacsv.read_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=8 << 20, use_threads=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types=column_types,
+                null_values=CSV_NULL_VALUES,
+                true_values=CSV_TRUE_VALUES,
+                false_values=CSV_FALSE_VALUES,
+                strings_can_be_null=True
+            )
+        )
+
+    table = parse()
+    # PyArrow infers dates and timestamps, which pandas leaves as the raw text;
+    # those columns are re-read as strings
+    temporal = {f.name: pa.string() for f in table.schema if pa.types.is_temporal(f.type)}
+    if temporal:
+        table = parse(temporal)
+    return table.to_pandas()
+
+
+def read_excel(source):
+    """Read the first sheet of an Excel path or file object."""
+    return pd.read_excel(source, engine=EXCEL_ENGINE)
+
+
+# -----------------------------------------------------
+# API responses (shared by api.py and main.py)
+# -----------------------------------------------------
+def json_default(value):
+    """orjson fallback for the pandas scalars it refuses (Timestamp, NaT, Timedelta)."""
+    if value is pd.NaT:
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class PandasJSONResponse(ORJSONResponse):
+    """
+    ORJSONResponse that also encodes pandas datetime cells, as jsonable_encoder
+    did before responses were returned directly. NaN still renders as null.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
 # -----------------------------------------------------
 # Core model loading and prep
 # -----------------------------------------------------
@@ -65,21 +179,37 @@ def prepare_X(df, train_cols, cat_levels):
     return X
 
 
-def predict(model, X, threshold):
+def predict_proba(model, X, num_threads=None):
+    """Positive-class probability for every row of X."""
+    if LIGHTGBM_AVAILABLE and isinstance(model, lgb.LGBMClassifier) and model.n_classes_ == 2:
+        # Straight to the LightGBM booster: skips the sklearn wrapper's input
+        # checks and predict_proba's two-column stack
+        params = {} if num_threads is None else {"num_threads": num_threads}
+        return model.booster_.predict(X, **params)
     if hasattr(model, "predict_proba"):
-        proba = model.predict_proba(X)[:, 1]
-    else:
-        proba = 1 / (1 + np.exp(-model.predict(X).ravel()))
+        return model.predict_proba(X)[:, 1]
+    return 1 / (1 + np.exp(-model.predict(X).ravel()))
+
+
+def predict(model, X, threshold):
+    # A single patient: one thread avoids OpenMP start-up on a one-row batch
+    proba = predict_proba(model, X, num_threads=1)
     decision = int(proba[0] >= threshold)
     return float(proba[0]), decision
 
 
+@lru_cache(maxsize=None)
+def get_explainer(model):
+    """One TreeExplainer per loaded model; building it walks every tree."""
+    return shap.TreeExplainer(model)
+
+
 def compute_contributions(model, X, feature_names):
     x_row = X.iloc[[0]]
     values = x_row.iloc[0].to_dict()
 
     try:
-        explainer = shap.TreeExplainer(model)
+        explainer = get_explainer(model)
         shap_values = explainer.shap_values(x_row)
         if isinstance(shap_values, list):
             shap_values = shap_values[1]
@@ -89,10 +219,10 @@ def compute_contributions(model, X, feature_names):
             "Value": [values[f] for f in feature_names],
             "Contribution": shap_contrib
         }).sort_values(by="Contribution", key=np.abs, ascending=False)
-        print("✅ SHAP used for contribution analysis.")
+        logger.debug("SHAP used for contribution analysis")
         return df
     except Exception as e:
-        print(f"⚠️ SHAP failed ({type(e).__name__}: {e}) → using proxy contributions.")
+        logger.warning("SHAP failed (%s: %s); using proxy contributions", type(e).__name__, e)
         proxy = []
         for f in feature_names:
             val = values[f]
@@ -100,23 +230,29 @@ def compute_contributions(model, X, feature_names):
             proxy.append((f, val, score))
         return pd.DataFrame(proxy, columns=["Feature", "Value", "Contribution"]).sort_values(by="Contribution", key=np.abs, ascending=False)
 
-def detect_disease_from_columns(df: pd.DataFrame) -> str:
-    """Infer disease name based on columns present in the uploaded data."""
-    cols = [c.lower() for c in df.columns]
 
-    if any(c in cols for c in ["glucose", "hba1c", "insulin"]):
-        return "Diabetes"
-    elif any(c in cols for c in ["wbc_count", "oxygen_saturation", "temperature"]):
-        return "Pneumonia"
-    elif any(c in cols for c in ["creatinine", "bun", "gfr", "albumin"]):
-        return "Chronic Kidney Disease"
-    else:
-        return "Unknown"
+def _is_missing(value):
+    """True for NaN/None/NaT scalars, which xlsxwriter cannot write as-is."""
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+def _excel_cell(value):
+    """Coerce a cell the way pandas' to_excel did: NaN/None/NaT blank, ±inf as
+    "inf"/"-inf" text, numpy bool/number scalars as native Python values."""
+    if _is_missing(value):
+        return None
+    if isinstance(value, (np.bool_, np.number)):
+        value = value.item()
+    if isinstance(value, float) and np.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return value
 
 # -----------------------------------------------------
 # Report generation (Excel / PDF / JSON)
 # -----------------------------------------------------
-def export_excel(patient_id, disease, patient_df, proba, decision, threshold, contrib_df):
+def export_excel(patient_id, disease, patient_df, proba, decision, threshold, contrib_df, fileobj=None):
     """
     Generate comprehensive Excel medical report with multiple formatted sheets:
     - Executive Summary
@@ -127,21 +263,9 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
     - Disease Progression Risk
     - Trending Data (if available)
     - Reference Ranges
-    """
-    import pandas as pd
-    import numpy as np
-    from datetime import datetime
-    import os
-    
-    from interpretation_rules import (
-        interpret_feature,
-        generate_medication_recommendations,
-        generate_related_disease_predictions,
-        REFERENCE_RANGES,
-        MEDICATION_PROTOCOLS,
-        DISEASE_PROGRESSION_MAP
-    )
     
+    If fileobj is given the workbook is written to it instead of OUT_DIR.
+    """
     path = os.path.join(OUT_DIR, f"{patient_id}_{disease.replace(' ', '_')}.xlsx")
     
     # Helper function to safely get patient data
@@ -156,7 +280,17 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         except Exception:
             return default
     
-    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+    # Write plain rows straight to a new sheet, skipping the DataFrame round trip
+    def write_sheet(sheet_name, rows):
+        worksheet = workbook.add_worksheet(sheet_name)
+        for row_idx, row in enumerate(rows):
+            worksheet.write_row(row_idx, 0, [_excel_cell(v) for v in row])
+        return worksheet
+    
+    # URL sniffing runs a regex over every string cell; report text never links anywhere
+    excel_options = {"strings_to_urls": False}
+    
+    with pd.ExcelWriter(fileobj if fileobj is not None else path, engine="xlsxwriter", engine_kwargs={"options": excel_options}) as writer:
         workbook = writer.book
         
         # Define formats
@@ -298,10 +432,7 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         demographics_data.append(['Comorbidities Count', get_value('comorbidities_count', 'N/A'), ''])
         demographics_data.append(['Follow-up Scheduled', 'Yes' if get_value('followup_scheduled', 0) == 1 else 'No', ''])
         
-        demographics_df = pd.DataFrame(demographics_data)
-        demographics_df.to_excel(writer, sheet_name='Patient Demographics', index=False, header=False)
-        
-        worksheet = writer.sheets['Patient Demographics']
+        worksheet = write_sheet('Patient Demographics', demographics_data)
         worksheet.set_column('A:A', 25)
         worksheet.set_column('B:B', 25)
         worksheet.set_column('C:C', 30)
@@ -315,8 +446,8 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         
         # Get all numeric columns
         for col in patient_df.columns:
-            if col.lower() in REFERENCE_RANGES:
-                ref = REFERENCE_RANGES[col.lower()]
+            ref = REFERENCE_RANGES.get(col.lower())
+            if ref is not None:
                 value = get_value(col, None)
                 
                 if value is not None and value != 'N/A':
@@ -341,10 +472,7 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
                     except:
                         clinical_data.append([col.replace('_', ' ').title(), value, '', '', 'N/A'])
         
-        clinical_df = pd.DataFrame(clinical_data)
-        clinical_df.to_excel(writer, sheet_name='Clinical Measurements', index=False, header=False)
-        
-        worksheet = writer.sheets['Clinical Measurements']
+        worksheet = write_sheet('Clinical Measurements', clinical_data)
         worksheet.set_column('A:A', 25)
         worksheet.set_column('B:B', 15)
         worksheet.set_column('C:C', 15)
@@ -364,33 +492,28 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         # ===========================================
         # SHEET 4: RISK ANALYSIS (SHAP VALUES)
         # ===========================================
-        feature_values = contrib_df.set_index("Feature")["Value"].to_dict()
-        
         risk_analysis_data = []
         risk_analysis_data.append(['SHAP RISK FACTOR ANALYSIS', '', '', '', '', ''])
         risk_analysis_data.append(['Rank', 'Feature', 'Value', 'SHAP Contribution', 'Impact', 'Clinical Interpretation'])
         
-        for idx, (_, row) in enumerate(contrib_df.head(15).iterrows(), start=1):
-            interpretation = interpret_feature(disease, row['Feature'], row['Contribution'], row['Value'])
+        for idx, row in enumerate(contrib_df.head(15).itertuples(index=False), start=1):
+            interpretation = interpret_feature(disease, row.Feature, row.Contribution, row.Value)
             # Clean interpretation
             interpretation = interpretation.replace('<b>', '').replace('</b>', '')
             interpretation = interpretation[:200] + '...' if len(interpretation) > 200 else interpretation
             
-            impact = "Increases Risk" if row['Contribution'] > 0 else "Decreases Risk"
+            impact = "Increases Risk" if row.Contribution > 0 else "Decreases Risk"
             
             risk_analysis_data.append([
                 idx,
-                row['Feature'],
-                row['Value'],
-                row['Contribution'],
+                row.Feature,
+                row.Value,
+                row.Contribution,
                 impact,
                 interpretation
             ])
         
-        risk_df = pd.DataFrame(risk_analysis_data)
-        risk_df.to_excel(writer, sheet_name='Risk Analysis', index=False, header=False)
-        
-        worksheet = writer.sheets['Risk Analysis']
+        worksheet = write_sheet('Risk Analysis', risk_analysis_data)
         worksheet.set_column('A:A', 8)
         worksheet.set_column('B:B', 25)
         worksheet.set_column('C:C', 15)
@@ -441,10 +564,7 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         else:
             med_data.append(['General', 'Consult attending physician for disease-specific protocol', '', ''])
         
-        med_df = pd.DataFrame(med_data)
-        med_df.to_excel(writer, sheet_name='Medication Protocol', index=False, header=False)
-        
-        worksheet = writer.sheets['Medication Protocol']
+        worksheet = write_sheet('Medication Protocol', med_data)
         worksheet.set_column('A:A', 25)
         worksheet.set_column('B:B', 50)
         worksheet.set_column('C:C', 30)
@@ -484,10 +604,7 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         else:
             progression_data.append(['', 'No specific progression data available', '', '', ''])
         
-        progression_df = pd.DataFrame(progression_data)
-        progression_df.to_excel(writer, sheet_name='Disease Progression', index=False, header=False)
-        
-        worksheet = writer.sheets['Disease Progression']
+        worksheet = write_sheet('Disease Progression', progression_data)
         worksheet.set_column('A:A', 15)
         worksheet.set_column('B:B', 30)
         worksheet.set_column('C:C', 20)
@@ -526,10 +643,7 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
                 ranges['unit']
             ])
         
-        ref_df = pd.DataFrame(ref_data)
-        ref_df.to_excel(writer, sheet_name='Reference Ranges', index=False, header=False)
-        
-        worksheet = writer.sheets['Reference Ranges']
+        worksheet = write_sheet('Reference Ranges', ref_data)
         worksheet.set_column('A:A', 25)
         worksheet.set_column('B:B', 15)
         worksheet.set_column('C:C', 15)
@@ -554,57 +668,38 @@ def export_excel(patient_id, disease, patient_df, proba, decision, threshold, co
         calc_data.append(['Strongest Risk Factor', contrib_df.iloc[0]['Feature'], 
                          f"Contribution: {contrib_df.iloc[0]['Contribution']:.3f}"])
         
-        calc_df = pd.DataFrame(calc_data)
-        calc_df.to_excel(writer, sheet_name='Calculations', index=False, header=False)
-        
-        worksheet = writer.sheets['Calculations']
+        worksheet = write_sheet('Calculations', calc_data)
         worksheet.set_column('A:A', 30)
         worksheet.set_column('B:B', 30)
         worksheet.set_column('C:C', 50)
     
-    print(f"✅ Excel report saved: {path}")
-    print(f"   📊 Sheets created: 9 (Executive Summary, Demographics, Clinical Measurements, " 
-          "Risk Analysis, Medications, Disease Progression, Raw Data, Reference Ranges, Calculations)")
+    if fileobj is not None:
+        logger.debug("Excel report rendered in memory for %s", patient_id)
+        return fileobj
+    logger.debug("Excel report saved: %s", path)
     return path
 
 
-def export_pdf(patient_id, disease, patient_df, proba, decision, threshold, contrib_df):
+def export_pdf(patient_id, disease, patient_df, proba, decision, threshold, contrib_df, fileobj=None):
     """
     Generate a professional 3-page patient PDF report.
     Page 1: Patient Overview & Clinical Management
     Page 2: Medication Recommendations
     Page 3: Disease Progression & Related Conditions
+    
+    If fileobj is given the PDF is written to it instead of OUT_DIR.
     """
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import (
-        SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, 
-        PageBreak, Frame, PageTemplate
-    )
-    from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
-    from datetime import datetime
-    import numpy as np
-    import os
-    
-    from interpretation_rules import (
-        interpret_feature,
-        generate_summary,
-        generate_medication_recommendations,
-        generate_related_disease_predictions
-    )
-
     path = os.path.join(OUT_DIR, f"{patient_id}_{disease.replace(' ', '_')}_report.pdf")
     
     # Create document with custom page template
     doc = SimpleDocTemplate(
-        path,
+        fileobj if fileobj is not None else path,
         pagesize=letter,
         rightMargin=0.5*inch,
         leftMargin=0.5*inch,
         topMargin=0.5*inch,
         bottomMargin=0.5*inch,
+        pageCompression=1,
     )
     
     # Styles
@@ -779,17 +874,17 @@ def export_pdf(patient_id, disease, patient_df, proba, decision, threshold, cont
             return str(v)
     
     top_features = contrib_df.head(8).copy()
-    feature_values = contrib_df.set_index("Feature")["Value"].to_dict()
+    feature_values = dict(zip(contrib_df["Feature"].to_numpy(), contrib_df["Value"].to_numpy()))
     
     contrib_table_data = [["Feature", "Value", "Contribution", "Impact", "Interpretation"]]
     
-    for _, row in top_features.iterrows():
-        feature = str(row["Feature"])
-        value = fmt_value(row["Value"])
-        contrib = float(row["Contribution"])
+    for row in top_features.itertuples(index=False):
+        feature = str(row.Feature)
+        value = fmt_value(row.Value)
+        contrib = float(row.Contribution)
         direction = "↑ Higher Risk" if contrib > 0 else "↓ Lower Risk"
         
-        interpretation = interpret_feature(disease, feature, contrib, row["Value"])
+        interpretation = interpret_feature(disease, feature, contrib, row.Value)
         # Clean interpretation - remove HTML and shorten
         interpretation = interpretation.replace("<b>", "").replace("</b>", "")
         if len(interpretation) > 150:
@@ -805,7 +900,7 @@ def export_pdf(patient_id, disease, patient_df, proba, decision, threshold, cont
             Paragraph(interpretation, small_style)
         ])
     
-    contrib_table = Table(contrib_table_data, colWidths=[0.9*inch, 0.7*inch, 0.8*inch, 0.9*inch, 3.7*inch])
+    contrib_table = Table(contrib_table_data, colWidths=[0.9*inch, 0.7*inch, 0.8*inch, 0.9*inch, 3.7*inch], repeatRows=1)
     contrib_table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
@@ -988,7 +1083,10 @@ def export_pdf(patient_id, disease, patient_df, proba, decision, threshold, cont
     
     # Build PDF
     doc.build(story)
-    print(f"✅ PDF report saved: {path}")
+    if fileobj is not None:
+        logger.debug("PDF report rendered in memory for %s", patient_id)
+        return fileobj
+    logger.debug("PDF report saved: %s", path)
     return path
 
 
@@ -1017,9 +1115,9 @@ def generate_report_from_file(file_path: str, disease: str = None):
 
     # --- read file ---
     if file_path.endswith(".csv"):
-        df = pd.read_csv(file_path)
+        df = read_csv(file_path)
     elif file_path.endswith(".xlsx"):
-        df = pd.read_excel(file_path)
+        df = read_excel(file_path)
     else:
         raise ValueError("Unsupported file format. Use .csv or .xlsx")
 